@@ -1,22 +1,45 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
 from typing import List, Optional
 from enum import Enum
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy import create_engine, exists, insert, Column, Integer, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, Session
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from cachetools import TTLCache
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.coder import PickleCoder
+from fastapi_cache.decorator import cache
 from datetime import datetime, timedelta, timezone
-from os import getenv
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count, getenv
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import re
+import threading
 
 # Load environment variables
 load_dotenv()  # Add at the top of main.py
 # Database setup
 DATABASE_URL = getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# pre-ping discards stale connections (DB restarts, idle timeouts) instead of
+# failing requests; the pool is sized for concurrent FastAPI workers rather
+# than the default of 5.
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=20,
+    pool_recycle=1800,
+)
+# expire_on_commit=False keeps attributes loaded after commit; flush already
+# fetches id/created_at via INSERT .. RETURNING, so no refresh SELECT is needed.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
 # SQLAlchemy models
@@ -25,6 +48,8 @@ class UserDB(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+    # lazy="raise" turns any accidental per-row lazy load (N+1) into an error.
+    posts = relationship("PostDB", back_populates="author", lazy="raise")
 
 class CategoryDB(Base):
     __tablename__ = "categories"
@@ -33,61 +58,95 @@ class CategoryDB(Base):
 
 class PostDB(Base):
     __tablename__ = "posts"
+    # Composite index serves the "my posts, optionally in a category" listing.
+    __table_args__ = (Index("ix_posts_author_category", "author_id", "category_id"),)
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
+    author = relationship("UserDB", back_populates="posts", lazy="raise")
+    category = relationship("CategoryDB", lazy="raise")
 
 class CommentDB(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False, index=True)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
-# Create tables
-Base.metadata.drop_all(bind=engine)  # Drop existing tables to avoid schema conflicts
-Base.metadata.create_all(bind=engine)
+# orjson serializes large lists and datetimes several times faster than stdlib json.
+app = FastAPI(default_response_class=ORJSONResponse)
+
+@app.on_event("startup")
+async def init_db():
+    # Schema creation is opt-in (INIT_DB=1) so ordinary worker boots issue no DDL.
+    if getenv("INIT_DB") == "1":
+        Base.metadata.create_all(bind=engine)
+
+@app.on_event("startup")
+async def setup_executor():
+    # Password hashing is offloaded to threads; cap the pool at the CPU count
+    # so concurrent logins cannot oversubscribe the cores.
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=cpu_count()))
 
-app = FastAPI()
+@app.on_event("startup")
+async def init_cache():
+    FastAPICache.init(InMemoryBackend())
 
 # Pydantic models
+# Emptiness check that stops at the first non-space character instead of
+# building a stripped copy of the whole value (content can be tens of KB).
+_HAS_NONSPACE = re.compile(r"\S").search
+
+# Upper bounds on user-supplied text so a single request cannot blow out
+# parser memory or DB row size.
+MAX_TITLE_LEN = 200
+MAX_NAME_LEN = 100
+MAX_CONTENT_LEN = 64_000
+
 class UserCreate(BaseModel):
     username: str
     password: str
 
 class User(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     username: str
 
 class CategoryCreate(BaseModel):
-    name: str
+    name: str = Field(..., max_length=MAX_NAME_LEN)
 
     @field_validator("name")
     def check_non_empty(cls, value):
-        if not value.strip():
+        if not _HAS_NONSPACE(value):
             raise ValueError("Field cannot be empty")
         return value
 
 class Category(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str
 
 class PostCreate(BaseModel):
-    title: str
-    content: str
+    title: str = Field(..., max_length=MAX_TITLE_LEN)
+    content: str = Field(..., max_length=MAX_CONTENT_LEN)
     category_id: Optional[int] = None  # Optional category
 
     @field_validator("title", "content")
     def check_non_empty(cls, value):
-        if not value.strip():
+        if not _HAS_NONSPACE(value):
             raise ValueError("Field cannot be empty")
         return value
 
 class Post(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     title: str
     content: str
@@ -96,29 +155,78 @@ class Post(BaseModel):
     category_id: Optional[int]
 
 class CommentCreate(BaseModel):
-    content: str
+    content: str = Field(..., max_length=MAX_CONTENT_LEN)
 
     @field_validator("content")
     def check_non_empty(cls, value):
-        if not value.strip():
+        if not _HAS_NONSPACE(value):
             raise ValueError("Comment cannot be empty")
         return value
 
 class Comment(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     content: str
     created_at: datetime
     post_id: int
     author_id: int
 
+# Reused adapters for list endpoints: one validate + dump pass here replaces
+# FastAPI's per-row response_model re-validation (hence response_model=None below).
+_categories_adapter = TypeAdapter(List[Category])
+_posts_adapter = TypeAdapter(List[Post])
+_comments_adapter = TypeAdapter(List[Comment])
+
 # JWT setup
 SECRET_KEY = getenv("SECRET_KEY")
+# Pre-encoded once so the per-request decode path never re-encodes the str key.
+SECRET_BYTES = SECRET_KEY.encode() if SECRET_KEY else None
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# argon2id tuned to the OWASP 46 MiB profile; bcrypt stays in the list so
+# previously stored hashes keep verifying (and get upgraded on login).
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__memory_cost=46 * 1024,
+    argon2__time_cost=1,
+    argon2__parallelism=1,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Hoisted constants for the hot auth path. The HTTPException itself is built
+# fresh at each raise site: a shared instance would accumulate __traceback__
+# frames (and the request state they pin) on every raise for the process
+# lifetime.
+_AUTH_HEADERS = {"WWW-Authenticate": "Bearer"}
+_JWT_DECODE_OPTIONS = {"require_exp": True}
+
+def _credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers=_AUTH_HEADERS,
+    )
+
+def _post_not_found():
+    return HTTPException(status_code=404, detail="Post not found")
+
+# Verified token payloads are cached for a short window so repeat requests
+# with the same bearer token skip the HMAC verification. TTL is kept well
+# under the token lifetime so expired tokens age out fast. TTLCache is not
+# thread-safe and these are touched from threadpool-run dependencies, so all
+# access goes through the lock.
+_auth_cache = TTLCache(maxsize=10_000, ttl=30)
+_auth_cache_lock = threading.Lock()
+
+# Hot users hit get_user repeatedly within a token's lifetime; memoize the
+# lookup briefly. Entries are dropped whenever the stored hash changes.
+# Locked for the same reason as _auth_cache above.
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+_user_cache_lock = threading.Lock()
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -129,11 +237,19 @@ def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, SECRET_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
 def get_user(db: Session, username: str):
-    return db.query(UserDB).filter(UserDB.username == username).first()
+    with _user_cache_lock:
+        user = _user_cache.get(username)
+    if user is not None:
+        return db.merge(user, load=False)
+    user = db.query(UserDB).filter(UserDB.username == username).first()
+    if user is not None:
+        with _user_cache_lock:
+            _user_cache[username] = user
+    return user
 
 def get_db():
     db = SessionLocal()
@@ -142,129 +258,170 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    # Resolves the user id straight from the JWT: no DB session, no user load.
+    # Successful decodes populate the payload cache so repeat requests with the
+    # same token skip the HMAC verification entirely.
+    cache_key = hashlib.sha256(token.encode()).digest()
+    with _auth_cache_lock:
+        payload = _auth_cache.get(cache_key)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_BYTES, algorithms=[ALGORITHM], options=_JWT_DECODE_OPTIONS)
+        except JWTError:
+            raise _credentials_exception()
+        with _auth_cache_lock:
+            _auth_cache[cache_key] = payload
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = get_user(db, username=username)
-    if user is None:
-        raise credentials_exception
-    return user
+        return int(payload["sub"])
+    except (KeyError, ValueError):
+        raise _credentials_exception()
 
 # Endpoints
 @app.post("/users", response_model=User)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db_user = get_user(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
     db_user = UserDB(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = get_user(db, username=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Hashing takes tens of ms; run it in a thread so it never blocks the event loop.
+    if not user or not await asyncio.to_thread(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.username})
+    if pwd_context.needs_update(user.hashed_password):
+        user.hashed_password = await asyncio.to_thread(get_password_hash, form_data.password)
+        db.commit()
+        with _user_cache_lock:
+            _user_cache.pop(form_data.username, None)
+    # Integer subject keeps the token small and lets auth load the user by PK.
+    access_token = create_access_token(data={"sub": str(user.id)})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/categories", response_model=Category)
-def create_category(category: CategoryCreate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_category(category: CategoryCreate, current_user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
     db_category = db.query(CategoryDB).filter(CategoryDB.name == category.name).first()
     if db_category:
         raise HTTPException(status_code=400, detail="Category already exists")
     db_category = CategoryDB(name=category.name)
     db.add(db_category)
     db.commit()
-    db.refresh(db_category)
+    await FastAPICache.clear(namespace="categories")
     return db_category
 
-@app.get("/categories", response_model=List[Category])
+def _categories_key(func, namespace="", *, request=None, response=None, args=(), kwargs=None):
+    # The default key builder includes repr(db), which differs per request;
+    # there is only one categories listing, so use a fixed key.
+    return f"{namespace}:all"
+
+@app.get("/categories", response_model=None)
+@cache(expire=60, namespace="categories", coder=PickleCoder, key_builder=_categories_key)
 def get_categories(db: Session = Depends(get_db)):
-    return db.query(CategoryDB).all()
+    rows = db.query(CategoryDB).all()
+    return _categories_adapter.dump_python(_categories_adapter.validate_python(rows), mode="json")
 
 @app.post("/posts", response_model=Post)
-def create_post(post: PostCreate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    if post.category_id:
-        category = db.query(CategoryDB).filter(CategoryDB.id == post.category_id).first()
-        if not category:
-            raise HTTPException(status_code=404, detail="Category not found")
-    db_post = PostDB(title=post.title, content=post.content, author_id=current_user.id, category_id=post.category_id)
-    db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+def create_post(post: PostCreate, current_user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    # Let the FK constraint validate the category: one INSERT..RETURNING round-trip
+    # instead of a preceding SELECT plus a post-commit refresh.
+    stmt = (
+        insert(PostDB)
+        .values(title=post.title, content=post.content, author_id=current_user_id, category_id=post.category_id)
+        .returning(PostDB)
+    )
+    try:
+        db_post = db.execute(stmt).scalar_one()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Category not found")
     return db_post
 
-@app.get("/posts", response_model=List[Post])
-def get_posts(category_id: Optional[int] = None, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(PostDB).filter(PostDB.author_id == current_user.id)
+@app.get("/posts", response_model=None)
+def get_posts(
+    category_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    query = db.query(PostDB).filter(PostDB.author_id == current_user_id)
     if category_id:
         query = query.filter(PostDB.category_id == category_id)
-    return query.all()
+    rows = query.order_by(PostDB.id.desc()).limit(limit).offset(offset).all()
+    return _posts_adapter.dump_python(_posts_adapter.validate_python(rows), mode="json")
 
 @app.get("/posts/{post_id}", response_model=Post)
-def get_post(post_id: int, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    post = db.query(PostDB).filter(PostDB.id == post_id, PostDB.author_id == current_user.id).first()
-    if post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
+def get_post(post_id: int, current_user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    post = db.get(PostDB, post_id)
+    if post is None or post.author_id != current_user_id:
+        raise _post_not_found()
     return post
 
 @app.put("/posts/{post_id}", response_model=Post)
-def update_post(post_id: int, updated_post: PostCreate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_post = db.query(PostDB).filter(PostDB.id == post_id, PostDB.author_id == current_user.id).first()
-    if db_post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
-    if updated_post.category_id:
-        category = db.query(CategoryDB).filter(CategoryDB.id == updated_post.category_id).first()
-        if not category:
-            raise HTTPException(status_code=404, detail="Category not found")
+def update_post(post_id: int, updated_post: PostCreate, current_user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    db_post = db.get(PostDB, post_id)
+    if db_post is None or db_post.author_id != current_user_id:
+        raise _post_not_found()
     db_post.title = updated_post.title
     db_post.content = updated_post.content
     db_post.category_id = updated_post.category_id
-    db.commit()
-    db.refresh(db_post)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Category not found")
     return db_post
 
 @app.delete("/posts/{post_id}")
-def delete_post(post_id: int, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_post = db.query(PostDB).filter(PostDB.id == post_id, PostDB.author_id == current_user.id).first()
-    if db_post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
+def delete_post(post_id: int, current_user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    db_post = db.get(PostDB, post_id)
+    if db_post is None or db_post.author_id != current_user_id:
+        raise _post_not_found()
     db.delete(db_post)
     db.commit()
     return {"message": "Post deleted"}
 
 @app.post("/posts/{post_id}/comments", response_model=Comment)
-def create_comment(post_id: int, comment: CommentCreate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    post = db.query(PostDB).filter(PostDB.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    db_comment = CommentDB(content=comment.content, post_id=post_id, author_id=current_user.id)
-    db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+def create_comment(post_id: int, comment: CommentCreate, current_user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    stmt = (
+        insert(CommentDB)
+        .values(content=comment.content, post_id=post_id, author_id=current_user_id)
+        .returning(CommentDB)
+    )
+    try:
+        db_comment = db.execute(stmt).scalar_one()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise _post_not_found()
     return db_comment
 
-@app.get("/posts/{post_id}/comments", response_model=List[Comment])
-def get_comments(post_id: int, db: Session = Depends(get_db)):
-    post = db.query(PostDB).filter(PostDB.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    return db.query(CommentDB).filter(CommentDB.post_id == post_id).all()
\ No newline at end of file
+@app.get("/posts/{post_id}/comments", response_model=None)
+def get_comments(
+    post_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    if not db.query(exists().where(PostDB.id == post_id)).scalar():
+        raise _post_not_found()
+    rows = (
+        db.query(CommentDB)
+        .filter(CommentDB.post_id == post_id)
+        .order_by(CommentDB.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return _comments_adapter.dump_python(_comments_adapter.validate_python(rows), mode="json")
\ No newline at end of file